@@ -1,3 +1,9 @@
-import importlib.metadata
+def __getattr__(name: str) -> str:
+    # importlib.metadata is slow to import, so the version is looked up on first use.
+    if name == "__version__":
+        import importlib.metadata
 
-__version__ = importlib.metadata.version("aws-object-search")
+        version = importlib.metadata.version("aws-object-search")
+        globals()["__version__"] = version
+        return version
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -3,16 +3,28 @@ Local catalog of the contents of cloud objects (S3/glacier).
 """
 
 import csv
-import gzip
+import errno
+import os
+import re
+import shutil
+from collections import defaultdict
 from collections.abc import Iterable
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from logging import getLogger
-from operator import attrgetter
+from operator import attrgetter, itemgetter
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple, TextIO
+
+try:
+    # Optional: ISA-L gzip is several times faster than zlib with the same API.
+    from isal import igzip as gzip
+except ImportError:
+    import gzip
 
 logger = getLogger(__name__)
+# Favor speed over size when compressing catalog files
+GZIP_COMPRESSLEVEL = 1
 OBJ_KEY_MAP = {
     "LastModified": "last_modified",
     "Size": "size",
@@ -23,11 +35,17 @@ OBJ_KEY_MAP = {
     "Key": "key",
 }
 TSV_FIELDS = [OBJ_KEY_MAP[k] for k in OBJ_KEY_MAP]
+# (AWS name, Python name) for each column of TSV_FIELDS
+TSV_FIELD_NAMES = tuple(OBJ_KEY_MAP.items())
+# Scan file names: YYYYMMDD-HHMMSS-BUCKET.tsv or .tsv.gz. Bucket names may contain dots.
+SCAN_FILE_NAME_RE = re.compile(r"(\d{8})-(\d{6})-(.+?)\.tsv(?:\.gz)?")
 
 
-@dataclass(frozen=True, order=True)
-class ObjectMetadata:
-    "Metadata for an object where all values are str. See flatten()."
+class ObjectMetadata(NamedTuple):
+    """
+    Metadata for an object where all values are str. See flatten().
+    A NamedTuple rather than a dataclass, since there is one for every row read.
+    """
 
     key: str
     last_modified: str
@@ -39,7 +57,10 @@ class ObjectMetadata:
 
     def flattened_dict(self) -> dict[str, str]:
         "Fatten to str-based dict"
-        return asdict(self)
+        return self._asdict()
+
+
+OBJECT_METADATA_FIELDS = ObjectMetadata._fields
 
 
 @dataclass(frozen=True, order=True)
@@ -51,26 +72,44 @@ class BucketScan:
     """
 
     file_path: Path
+    # Parsed from file_path in __post_init__
+    bucket_name: str = field(init=False, compare=False)
+    scan_start: datetime = field(init=False, compare=False)
 
-    @property
-    def bucket_name(self) -> str:
-        "Return name of the bucket, parsed from file_path."
-        # Can't use stem, because it only removes the last suffix.
-        return self.file_path.stem.split(".", 1)[0].split("-", 2)[2]
-
-    @property
-    def scan_start(self) -> datetime:
-        "Return datetime for scan start, parsed from file_path."
-        assert self.file_path.name[15] == "-"
-        return datetime.strptime(self.file_path.name[:15], "%Y%m%d-%H%M%S")
+    def __post_init__(self):
+        "Parse bucket_name and scan_start once instead of on every access."
+        match = SCAN_FILE_NAME_RE.fullmatch(self.file_path.name)
+        if match is None:
+            raise ValueError(f"unrecognized scan file name: {self.file_path}")
+        date, time, bucket_name = match.groups()
+        # Faster than strptime, which parses the format on every call.
+        scan_start = datetime(
+            int(date[:4]),
+            int(date[4:6]),
+            int(date[6:]),
+            int(time[:2]),
+            int(time[2:4]),
+            int(time[4:]),
+        )
+        # The dataclass is frozen, so bypass its __setattr__.
+        object.__setattr__(self, "bucket_name", bucket_name)
+        object.__setattr__(self, "scan_start", scan_start)
 
     def contents(self) -> Iterable[ObjectMetadata]:
         "Iterate the underlying file's contents."
+        yield from map(ObjectMetadata._make, self.rows())
+
+    def rows(self) -> Iterable[tuple[str, ...]]:
+        "Iterate the underlying file's rows as tuples in ObjectMetadata field order."
         o = gzip.open if self.file_path.suffix == ".gz" else open
         with o(self.file_path, "rt", newline="", encoding="utf-8") as tsv_file:
-            reader = csv.DictReader(tsv_file, delimiter="\t")
-            for row in reader:
-                yield ObjectMetadata(**row)
+            reader = csv.reader(tsv_file, delimiter="\t")
+            header = next(reader, None)
+            if header is None:
+                return
+            # Reorder the columns of each row to match the ObjectMetadata fields.
+            to_fields = itemgetter(*(header.index(f) for f in OBJECT_METADATA_FIELDS))
+            yield from map(to_fields, reader)
 
     def flattened_dict(self) -> dict[str, str]:
         "Fatten to str-based dict"
@@ -97,8 +136,11 @@ class S3ObjectCatalog:
 
     def iter_dicts(self) -> Iterable[dict[str, str]]:
         "Iterate all current contents flattened to dict and str"
-        for bucket_scan, object_metadata in self.current_contents():
-            yield bucket_scan.flattened_dict() | object_metadata.flattened_dict()
+        for bucket_scan in self.current_bucket_scans():
+            # Build the per-scan fields once, and skip ObjectMetadata for each row.
+            scan_dict = bucket_scan.flattened_dict()
+            for values in bucket_scan.rows():
+                yield scan_dict | dict(zip(OBJECT_METADATA_FIELDS, values, strict=True))
 
     def current_contents(self) -> Iterable[tuple[BucketScan, ObjectMetadata]]:
         "Yield everything current"
@@ -110,57 +152,93 @@ class S3ObjectCatalog:
         """
         Return list sorted by scan_start of only the most recent scan for each bucket.
         """
+        most_recent_scans, _ = self._partition_scans()
+        return sorted(most_recent_scans, key=attrgetter("scan_start", "bucket_name"))
+
+    def _partition_scans(self) -> tuple[list[BucketScan], list[BucketScan]]:
+        """
+        Split all scans in a single pass into the most recent scan for each bucket
+        and the older scans that they supersede.
+        """
         most_recent_scans: dict[str, BucketScan] = {}
+        old_scans: list[BucketScan] = []
         for b in self.all_bucket_scans():
-            if (
-                b.bucket_name not in most_recent_scans
-                or b.scan_start > most_recent_scans[b.bucket_name].scan_start
-            ):
+            current = most_recent_scans.get(b.bucket_name)
+            if current is None:
                 most_recent_scans[b.bucket_name] = b
-        return sorted(
-            most_recent_scans.values(), key=attrgetter("scan_start", "bucket_name")
-        )
+            elif b.scan_start > current.scan_start:
+                most_recent_scans[b.bucket_name] = b
+                old_scans.append(current)
+            else:
+                old_scans.append(b)
+        return list(most_recent_scans.values()), old_scans
 
     def all_bucket_scans(self) -> Iterable[BucketScan]:
         """Yield all scans in catalog, .tsv files before .tsv.gz files."""
-        patterns = ["????????-??????-*.tsv", "????????-??????-*.tsv.gz"]
-        for pattern in patterns:
-            for file_path in self.catalog_root.glob(pattern):
-                yield BucketScan(file_path)
+        # A single pass over the directory, matching the equivalent of the
+        # glob patterns "????????-??????-*.tsv" and "????????-??????-*.tsv.gz"
+        tsv_paths = []
+        tsv_gz_paths = []
+        try:
+            with os.scandir(self.catalog_root) as entries:
+                for entry in entries:
+                    name = entry.name
+                    # is_file() uses the type from the directory listing, so it
+                    # only needs a stat call for a symlink.
+                    if (
+                        len(name) > 16
+                        and name[8] == name[15] == "-"
+                        and entry.is_file()
+                    ):
+                        if name.endswith(".tsv"):
+                            tsv_paths.append(entry.path)
+                        elif name.endswith(".tsv.gz"):
+                            tsv_gz_paths.append(entry.path)
+        except FileNotFoundError:
+            return
+        for file_path in tsv_paths + tsv_gz_paths:
+            yield BucketScan(Path(file_path))
 
     def archive_old_scans(self) -> None:
         """
         Move old (non-current) scan files to archive directory organized by date.
         Archive path format: {catalog_root}/archive/{year}/{month}/{day}/
         """
-        current_scans = {b.file_path for b in self.current_bucket_scans()}
-        old_scans = [
-            b for b in self.all_bucket_scans() if b.file_path not in current_scans
-        ]
+        _, old_scans = self._partition_scans()
 
         if not old_scans:
             logger.info("No old scans to archive")
             return
 
+        # Group by date, so that each archive directory is created only once.
+        scans_by_date: dict[tuple[str, str, str], list[BucketScan]] = defaultdict(list)
         for scan in old_scans:
-            # Extract year, month, day from scan_start
-            year = scan.scan_start.strftime("%Y")
-            month = scan.scan_start.strftime("%m")
-            day = scan.scan_start.strftime("%d")
+            start = scan.scan_start
+            date = (f"{start.year:04}", f"{start.month:02}", f"{start.day:02}")
+            scans_by_date[date].append(scan)
 
+        for (year, month, day), scans in scans_by_date.items():
             # Create archive directory path
             archive_dir = self.catalog_root / "archive" / year / month / day
             archive_dir.mkdir(parents=True, exist_ok=True)
 
-            # Move file to archive
-            destination = archive_dir / scan.file_path.name
-            logger.info(f"Archiving {scan.file_path.name} to {archive_dir}")
-            try:
-                scan.file_path.rename(destination)
-            except FileExistsError:
-                logger.warning(f"Destination already exists, skipping: {destination}")
-            except OSError as e:
-                logger.error(f"Failed to archive {scan.file_path.name}: {e}")
+            for scan in scans:
+                # Move file to archive
+                name = scan.file_path.name
+                logger.info(f"Archiving {name} to {archive_dir}")
+                try:
+                    move_file(scan.file_path, archive_dir / name)
+                except OSError as e:
+                    logger.error(f"Failed to archive {name}: {e}")
+
+    def remove_partial_files(self) -> None:
+        """
+        Remove the ".partial" files left by a scan that was killed before it could
+        clean up. Only call this while no other scan is writing to the catalog.
+        """
+        for partial_path in self.catalog_root.glob("*.tsv.gz.partial"):
+            logger.warning(f"Removing incomplete scan file {partial_path.name}")
+            partial_path.unlink(missing_ok=True)
 
     def output_s3_objects_to_tsv(
         self,
@@ -171,6 +249,9 @@ class S3ObjectCatalog:
         """
         Output S3 objects to a TSV file.
         Create the parent directory if it doesn't exist.
+        The file is written under a temporary ".partial" name and renamed when
+        complete, so an interrupted scan never looks like a finished one.
+        If iterating s3_objects fails, remove the incomplete file.
         :param s3_objects: Iterable of S3 objects
         :param bucket_name: Name of the S3 bucket
         :param prefix: optional value to use instead of timestamp in output file names
@@ -179,15 +260,22 @@ class S3ObjectCatalog:
         assert isinstance(bucket_name, str)
         tsv_file_path = self.new_tsv_gz_file_path(bucket_name, prefix)
         self.ensure_catalog_root(tsv_file_path)
-        with gzip.open(tsv_file_path, "wt", newline="", encoding="utf-8") as tsv_file:
-            writer = csv.DictWriter(tsv_file, fieldnames=TSV_FIELDS, delimiter="\t")
-            writer.writeheader()
-            for obj in s3_objects:
-                writer.writerow(
-                    # By using the get method with default,
-                    # handle cases with AWS names or Python names
-                    {OBJ_KEY_MAP.get(k, k): flatten(v) for k, v in obj.items()}
-                )
+        partial_path = tsv_file_path.with_name(f"{tsv_file_path.name}.partial")
+        try:
+            with gzip.open(
+                partial_path,
+                "wt",
+                compresslevel=GZIP_COMPRESSLEVEL,
+                newline="",
+                encoding="utf-8",
+            ) as tsv_file:
+                writer = csv.writer(tsv_file, delimiter="\t")
+                writer.writerow(TSV_FIELDS)
+                write_tsv_rows(tsv_file, writer, map(tsv_row, s3_objects))
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+        partial_path.replace(tsv_file_path)
 
     def new_tsv_gz_file_path(self, bucket_name: str, prefix: str | None = None) -> Path:
         """
@@ -209,28 +297,86 @@ class S3ObjectCatalog:
         """
         assert isinstance(tsv_file_path, str | Path)
         assert tsv_file_path
-        catalog_root = Path(tsv_file_path).parent.resolve()
-        if not catalog_root.exists():
+        catalog_root = Path(tsv_file_path).parent
+        # mkdir checks for an existing directory itself, so no separate stat calls.
+        try:
             catalog_root.mkdir(parents=True, exist_ok=True)
-        if not catalog_root.is_dir():
-            raise ValueError(f"{catalog_root} must be a directory")
+        except FileExistsError:
+            raise ValueError(f"{catalog_root.resolve()} must be a directory") from None
+
+
+def move_file(source: Path, target: Path) -> None:
+    """
+    Rename source to target, which is a single syscall on the same filesystem.
+    Fall back to copying and deleting if the archive is on another filesystem.
+    """
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source, target)
+
+
+def write_tsv_rows(tsv_file: TextIO, writer, rows: Iterable[list[str]]) -> None:
+    """
+    Write rows exactly as writer, a csv.writer for tsv_file, would write them.
+    Rows that need no quoting, which is nearly all of them, are joined directly,
+    since that is several times faster than csv.writer. The rest go to writer.
+    :param tsv_file: File that writer writes to
+    :param writer: csv.writer with a tab delimiter and the default line terminator
+    :param rows: Rows of two or more str values
+    """
+    write = tsv_file.write
+    writerow = writer.writerow
+    for row in rows:
+        line = "\t".join(row)
+        if (
+            line.count("\t") != len(row) - 1
+            or '"' in line
+            or "\n" in line
+            or "\r" in line
+        ):
+            writerow(row)
+        else:
+            write(f"{line}\r\n")
+
+
+def tsv_row(obj: dict[str, Any]) -> list[str]:
+    """
+    Return the values of an S3 object in TSV_FIELDS order, flattened to str.
+    Handle objects with AWS names or Python names. Missing values are empty.
+    :param obj: S3 object
+    :return: List of flattened values
+    """
+    row = []
+    for aws_name, python_name in TSV_FIELD_NAMES:
+        value = obj.get(aws_name, obj.get(python_name))
+        row.append("" if value is None else flatten(value))
+    return row
 
 
 def flatten(value):
     """
     Flatten a value to a string.
+    Dispatches on the exact type, since this runs for every field of every object.
     :param value: Value to flatten
     :return: Flattened value as a string
     """
-    match value:
-        case list():
-            return ":".join(value)
-        case datetime():
-            return value.isoformat()
-        case str():
-            if value[0] == value[-1] == '"':
-                return value[1:-1]
-            else:
-                return value
-        case _:
-            return str(value)
+    return _FLATTENERS.get(type(value), str)(value)
+
+
+def _flatten_str(value: str) -> str:
+    "Strip the double quotes that S3 puts around ETags."
+    # Most values are unquoted, so test the first character before anything else.
+    if value and value[0] == '"' == value[-1] and len(value) > 1:
+        return value[1:-1]
+    else:
+        return value
+
+
+_FLATTENERS = {
+    list: ":".join,
+    datetime: datetime.isoformat,
+    str: _flatten_str,
+}
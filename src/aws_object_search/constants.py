@@ -0,0 +1,6 @@
+"""Defaults shared by the command line and the modules behind it."""
+
+# Kept apart from s3_wrapper, so that the CLI can use them without importing boto3.
+
+# Number of buckets to scan concurrently
+DEFAULT_MAX_WORKERS = 8
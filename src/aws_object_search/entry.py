@@ -1,31 +1,39 @@
 import argparse
 import fcntl
+import os
+import sys
+from collections import Counter
+from collections.abc import Iterable
+from functools import cache
 from logging import getLogger
 from pathlib import Path
-from sys import exit, prefix, stderr
+from sys import exit, prefix
+from typing import Any, NoReturn, TextIO
 
-import botocore.exceptions
-
-from . import __version__
+from .constants import DEFAULT_MAX_WORKERS
 from .logging import config_logging
-from .s3_wrapper import run_s3_object_scan
-from .tantivy_wrapper import index_catalog, run_query
+from .tantivy_wrapper import URI_FIELDS, index_catalog, run_queries, run_query
 
 logger = getLogger(__name__)
 
 # Default directory for catalog and index files
 DEFAULT_OUTPUT_ROOT = Path(prefix).resolve().parent / "s3_objects"
 
+# Buffer size for the search.py output files
+OUTPUT_BUFFER_SIZE = 1 << 20
+# Number of result lines to collect before writing them together
+WRITE_BATCH_SIZE = 1024
+
 # File endings for filtering search results
-RAW_READS_ENDINGS = [
+RAW_READS_ENDINGS = (
     "_sequence.txt.bz2",
     "_sequence.txt.gz",
     "_sequence.txt",
     ".fastq.gz",
     "_001.fastq.gz",
-]
+)
 
-CONFIG_ENDINGS = [
+CONFIG_ENDINGS = (
     "BWAConfigParams.txt",
     ".config.csv",
     "config.txt",
@@ -34,29 +42,27 @@ CONFIG_ENDINGS = [
     "SEDefn.json",
     "MEDefn.json",
     "MergeDefn.json",
-]
+)
 
-BAM_ENDINGS = [
+BAM_ENDINGS = (
     "_realigned.bam",
     ".realigned.recal.bam",
     ".recal.realigned.bam",
     ".hgv.bam",
-]
+)
 
-CRAM_ENDINGS = [
-    ".hgv.cram",
-]
+CRAM_ENDINGS = (".hgv.cram",)
 
-VCF_ENDINGS = [
+VCF_ENDINGS = (
     ".SNPs_Annotated.vcf",
     "_snp.vcf.gz",
     ".INDELs_Annotated.vcf",
     "_indel.vcf.gz",
-]
+)
 
-BAM_INDEX_ENDINGS = ["bam.bai"]
-CRAM_INDEX_ENDINGS = ["cram.crai"]
-VCF_INDEX_ENDINGS = ["vcf.gz.tbi"]
+BAM_INDEX_ENDINGS = ("bam.bai",)
+CRAM_INDEX_ENDINGS = ("cram.crai",)
+VCF_INDEX_ENDINGS = ("vcf.gz.tbi",)
 
 
 def aos_scan(args: argparse.Namespace | None = None) -> None:
@@ -66,26 +72,30 @@ def aos_scan(args: argparse.Namespace | None = None) -> None:
     config_logging(args.log_level)
 
     # Acquire lock if flock option is specified
-    lock_file = None
+    lock_fd = None
     if args.flock is not None:
         try:
-            # Open lock file for writing (create if doesn't exist)
-            lock_file = open(args.flock, "w")
+            # Open lock file for writing (create if doesn't exist), without
+            # truncating it, since another process may hold the lock.
+            lock_fd = os.open(args.flock, os.O_WRONLY | os.O_CREAT, 0o644)
             # Attempt to acquire exclusive lock (non-blocking)
-            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Record the PID of the lock holder for debugging
+            os.ftruncate(lock_fd, 0)
+            os.write(lock_fd, f"{os.getpid()}\n".encode())
             logger.info(f"Acquired lock on {args.flock}")
         except BlockingIOError:
             logger.critical(
                 f"Another aos-scan process is already running "
                 f"(lock file: {args.flock}). Exiting."
             )
-            if lock_file is not None:
-                lock_file.close()
+            if lock_fd is not None:
+                os.close(lock_fd)
             exit(2)
         except Exception as e:
             logger.critical(f"Failed to acquire lock on {args.flock}: {e}")
-            if lock_file is not None:
-                lock_file.close()
+            if lock_fd is not None:
+                os.close(lock_fd)
             exit(2)
 
     try:
@@ -95,10 +105,17 @@ def aos_scan(args: argparse.Namespace | None = None) -> None:
         logger.info(f"Indexing: {not args.no_index}")
         if not args.no_scan:
             logger.info("Scanning AWS Objects...")
+            # Imported here because boto3 is slow to import and searches never use it.
+            import botocore.exceptions
+
+            from .s3_wrapper import run_s3_object_scan
+
             try:
                 run_s3_object_scan(
                     args.output_root,
                     args.bucket_prefix,
+                    max_workers=args.jobs,
+                    shard_prefixes=args.shard_prefixes,
                 )
             except botocore.exceptions.TokenRetrievalError as e:
                 logger.error(f"Failed to retrieve S3 buckets: {e}")
@@ -110,13 +127,19 @@ def aos_scan(args: argparse.Namespace | None = None) -> None:
             index_catalog(args.output_root, args.output_root / "index")
     finally:
         # Release lock and close lock file
-        if lock_file is not None:
-            lock_file.close()
+        if lock_fd is not None:
+            os.close(lock_fd)
             logger.info(f"Released lock on {args.flock}")
 
 
 def parse_scan_args() -> argparse.Namespace:
     "Parse command line arguments."
+    return build_scan_parser().parse_args()
+
+
+@cache
+def build_scan_parser() -> argparse.ArgumentParser:
+    "Build the argument parser for aos-scan."
     parser = argparse.ArgumentParser(
         description="Scan AWS S3 buckets, list their key in TSV files, "
         "and index the results."
@@ -124,8 +147,7 @@ def parse_scan_args() -> argparse.Namespace:
     parser.add_argument(
         "-V",
         "--version",
-        action="version",
-        version=f"%(prog)s {__version__}",
+        action=VersionAction,
         help="Show the version of the program",
     )
     parser.add_argument(
@@ -151,6 +173,19 @@ def parse_scan_args() -> argparse.Namespace:
         action="store_true",
         help="Suppress indexing",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=DEFAULT_MAX_WORKERS,
+        help="Maximum number of buckets to scan concurrently "
+        f"(default: {DEFAULT_MAX_WORKERS})",
+    )
+    parser.add_argument(
+        "--shard-prefixes",
+        action="store_true",
+        help="List the top-level prefixes of each bucket concurrently",
+    )
     parser.add_argument(
         "--log-level",
         type=str,
@@ -165,12 +200,13 @@ def parse_scan_args() -> argparse.Namespace:
         help="Path to lock file for preventing concurrent scans "
         "(optional, no locking if not specified)",
     )
-    return parser.parse_args()
+    return parser
 
 
 def search_aws(args: argparse.Namespace | None = None) -> None:
     "Entry point for searching the index with simple output."
-    if args is None:
+    from_cli = args is None
+    if from_cli:
         args = parse_search_aws_args()
     config_logging(args.log_level)
     logger.info(f"Output root: {args.output_root}")
@@ -183,26 +219,28 @@ def search_aws(args: argparse.Namespace | None = None) -> None:
 
     try:
         results = run_query(
-            args.output_root / "index", args.query, args.max_results_per_query
+            args.output_root / "index",
+            args.query,
+            args.max_results_per_query,
+            fields=URI_FIELDS if args.uri_only else None,
         )
 
-        for _score, doc in results:
-            s3_uri = f"s3://{doc.bucket_name}/{doc.key}"
-
-            # Apply file ending filter
-            if not filter_by_file_endings(s3_uri, file_endings):
-                continue
-
-            format_and_write_result(doc, args.uri_only)
-
+        write_results(results, file_endings, args.uri_only, sys.stdout)
     except BrokenPipeError:
         pass  # normal; for example, piped to "head" command
-    stderr.close()
+    if from_cli:
+        fast_exit(0)
     exit(0)
 
 
 def parse_search_aws_args() -> argparse.Namespace:
     "Parse command line arguments for search-aws."
+    return build_search_aws_parser().parse_args()
+
+
+@cache
+def build_search_aws_parser() -> argparse.ArgumentParser:
+    "Build the argument parser for search-aws."
     parser = argparse.ArgumentParser(
         description="Search index of keys in AWS S3 buckets with simple output.",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -227,48 +265,21 @@ Output format:
     parser.add_argument(
         "-V",
         "--version",
-        action="version",
-        version=f"%(prog)s {__version__}",
+        action=VersionAction,
         help="Show the version of the program",
     )
     parser.add_argument(
         "query",
         help="Query string to search for",
     )
-    parser.add_argument(
-        "-m",
-        "--max-results-per-query",
-        type=int,
-        default=10_000_000,
-        help="Maximum results per query (default: 10,000,000)",
-    )
-    parser.add_argument(
-        "-o",
-        "--output-root",
-        type=Path,
-        default=DEFAULT_OUTPUT_ROOT,
-        help="Output root directory containing the scan files (default: "
-        f"{DEFAULT_OUTPUT_ROOT})",
-    )
-    parser.add_argument(
-        "-u",
-        "--uri-only",
-        action="store_true",
-        help="Suppress all output except for the S3 URIs",
-    )
-    parser.add_argument(
-        "--log-level",
-        type=str,
-        default="WARNING",
-        help="Logging level (default: WARNING)",
-    )
-    add_file_type_filter_arguments(parser)
-    return parser.parse_args()
+    add_search_arguments(parser)
+    return parser
 
 
 def search_py(args: argparse.Namespace | None = None) -> None:
     "Entry point for search.py command - processes input file with search terms."
-    if args is None:
+    from_cli = args is None
+    if from_cli:
         args = parse_search_py_args()
     config_logging(args.log_level)
     logger.info(f"Output root: {args.output_root}")
@@ -282,7 +293,11 @@ def search_py(args: argparse.Namespace | None = None) -> None:
     # Read search terms from input file
     try:
         with open(args.file) as f:
-            search_terms = [line.strip() for line in f if line.strip()]
+            # Text mode turns every line ending into "\n". Unlike splitlines,
+            # split("\n") splits only there, like iterating over the file.
+            # Strip each line once, then drop the blank ones.
+            lines = f.read().split("\n")
+            search_terms = list(filter(None, map(str.strip, lines)))
     except FileNotFoundError:
         logger.error(f"Input file not found: {args.file}")
         exit(1)
@@ -290,84 +305,92 @@ def search_py(args: argparse.Namespace | None = None) -> None:
         logger.error(f"Error reading input file: {e}")
         exit(1)
 
+    # Open the index once, and search for each distinct term only once.
+    # Terms that occur more than once have their output replayed.
+    term_counts = Counter(search_terms)
+    try:
+        queries = run_queries(
+            args.output_root / "index",
+            term_counts,  # distinct terms in order of first occurrence
+            args.max_results_per_query,
+            fields=URI_FIELDS if args.uri_only else None,
+        )
+    except ValueError as e:
+        logger.error(f"Error opening index: {e}")
+        exit(1)
+
     # Prepare output files
-    input_path = Path(args.file)
+    # Output file names extend the full input file name.
+    input_path = str(Path(args.file))
     output_files = {
-        "out": input_path.with_suffix(input_path.suffix + ".out.tsv"),
-        "info": input_path.with_suffix(input_path.suffix + ".out.info"),
-        "not_found": input_path.with_suffix(input_path.suffix + ".not_found.txt"),
-        "not_found_list": input_path.with_suffix(input_path.suffix + ".not_found.list"),
+        "out": Path(f"{input_path}.out.tsv"),
+        "info": Path(f"{input_path}.out.info"),
+        "not_found": Path(f"{input_path}.not_found.txt"),
+        "not_found_list": Path(f"{input_path}.not_found.list"),
     }
 
-    not_found_terms = []
+    not_found_count = 0
     total_matches = 0
 
     try:
         with (
-            open(output_files["out"], "w") as out_file,
-            open(output_files["info"], "w") as info_file,
-            open(output_files["not_found"], "w") as not_found_file,
-            open(output_files["not_found_list"], "w") as not_found_list_file,
+            open_output(output_files["out"]) as out_file,
+            open_output(output_files["info"]) as info_file,
+            open_output(output_files["not_found"]) as not_found_file,
+            open_output(output_files["not_found_list"]) as not_found_list_file,
         ):
             # Write headers
             info_file.write("# Search results summary\n")
             info_file.write(f"# Input file: {args.file}\n")
             info_file.write(f"# Total search terms: {len(search_terms)}\n")
 
+            replays = {}  # term -> (lines, error) for terms that occur again
             for term in search_terms:
-                logger.info(f"Searching for: '{term}'")
-                try:
-                    results = list(
-                        run_query(
-                            args.output_root / "index", term, args.max_results_per_query
+                logger.info("Searching for: '%s'", term)
+                if term in replays:
+                    lines, error = replays[term]
+                    out_file.writelines(lines)
+                    match_count = len(lines)
+                else:
+                    # Distinct terms are searched in order of first occurrence.
+                    queried, results = next(queries)
+                    assert queried == term, (queried, term)
+                    # Keep the output of a repeated term in memory for replay.
+                    lines = [] if term_counts[term] > 1 else None
+                    error = None
+                    match_count = 0
+                    try:
+                        match_count = write_results(
+                            results, file_endings, args.uri_only, out_file, lines
                         )
-                    )
+                    except ValueError as e:
+                        # tantivy reports invalid queries with ValueError. Other
+                        # errors, such as failed writes, are not about the term.
+                        error = e
+                    if lines is not None:
+                        replays[term] = (lines, error)
+
+                if error is not None:
+                    logger.error(f"Error searching for '{term}': {error}")
+                    not_found_count += 1
+                    not_found_file.write(f"{term}\tError: {error}\n")
+                    not_found_list_file.write(f"{term}\n")
+                    continue
 
-                    if results:
-                        # Apply file ending filter to results
-                        filtered_results = [
-                            (_score, doc)
-                            for _score, doc in results
-                            if filter_by_file_endings(
-                                f"s3://{doc.bucket_name}/{doc.key}", file_endings
-                            )
-                        ]
-
-                        match_count = len(filtered_results)
-                        total_matches += match_count
-
-                        if filtered_results:
-                            info_file.write(f"{term}\t{match_count} matches\n")
-
-                            for _score, doc in filtered_results:
-                                format_and_write_result(doc, args.uri_only, out_file)
-                        else:
-                            # No results after filtering
-                            record_not_found_term(
-                                term,
-                                not_found_terms,
-                                not_found_file,
-                                not_found_list_file,
-                                info_file,
-                            )
-                    else:
-                        record_not_found_term(
-                            term,
-                            not_found_terms,
-                            not_found_file,
-                            not_found_list_file,
-                            info_file,
-                        )
+                total_matches += match_count
 
-                except Exception as e:
-                    logger.error(f"Error searching for '{term}': {e}")
-                    not_found_terms.append(term)
-                    not_found_file.write(f"{term}\tError: {e}\n")
-                    not_found_list_file.write(f"{term}\n")
+                if match_count:
+                    info_file.write(f"{term}\t{match_count} matches\n")
+                else:
+                    # No results, possibly after filtering
+                    not_found_count += 1
+                    record_not_found_term(
+                        term, not_found_file, not_found_list_file, info_file
+                    )
 
             # Write summary to info file
             info_file.write(f"# Total matches found: {total_matches}\n")
-            info_file.write(f"# Terms with no matches: {len(not_found_terms)}\n")
+            info_file.write(f"# Terms with no matches: {not_found_count}\n")
 
     except OSError as e:
         logger.error(f"Error writing output files: {e}")
@@ -375,13 +398,35 @@ def search_py(args: argparse.Namespace | None = None) -> None:
 
     logger.info(f"Search completed. Results written to {output_files['out']}")
     logger.info(f"Summary written to {output_files['info']}")
-    if not_found_terms:
+    if not_found_count:
         logger.info(f"Terms with no matches written to {output_files['not_found']}")
+    if from_cli:
+        fast_exit(0)
     exit(0)
 
 
 def parse_search_py_args() -> argparse.Namespace:
     "Parse command line arguments for search.py."
+    parser = build_search_py_parser()
+    args = parser.parse_args()
+
+    # Handle backwards compatibility: use -f/--file if provided,
+    # otherwise use positional
+    if args.file_alt:
+        args.file = args.file_alt
+
+    # Ensure we have a file specified
+    if not args.file:
+        parser.error(
+            "Input file is required (either as positional argument or with -f/--file)"
+        )
+
+    return args
+
+
+@cache
+def build_search_py_parser() -> argparse.ArgumentParser:
+    "Build the argument parser for search.py."
     parser = argparse.ArgumentParser(
         description="Search index of keys in AWS S3 buckets using input file "
         "with search terms.",
@@ -413,8 +458,7 @@ Output format:
     parser.add_argument(
         "-V",
         "--version",
-        action="version",
-        version=f"%(prog)s {__version__}",
+        action=VersionAction,
         help="Show the version of the program",
     )
     parser.add_argument(
@@ -429,58 +473,18 @@ Output format:
         help="Input file (for backwards compatibility - "
         "use positional argument instead)",
     )
-    parser.add_argument(
-        "-m",
-        "--max-results-per-query",
-        type=int,
-        default=10_000_000,
-        help="Maximum results per query (default: 10,000,000)",
-    )
-    parser.add_argument(
-        "-o",
-        "--output-root",
-        type=Path,
-        default=DEFAULT_OUTPUT_ROOT,
-        help="Output root directory containing the scan files "
-        f"(default: {DEFAULT_OUTPUT_ROOT})",
-    )
-    parser.add_argument(
-        "-u",
-        "--uri-only",
-        action="store_true",
-        help="Suppress all output except for the S3 URIs",
-    )
-    parser.add_argument(
-        "--log-level",
-        type=str,
-        default="WARNING",
-        help="Logging level (default: WARNING)",
-    )
-    add_file_type_filter_arguments(parser)
-    args = parser.parse_args()
-
-    # Handle backwards compatibility: use -f/--file if provided,
-    # otherwise use positional
-    if args.file_alt:
-        args.file = args.file_alt
-
-    # Ensure we have a file specified
-    if not args.file:
-        parser.error(
-            "Input file is required (either as positional argument or with -f/--file)"
-        )
-
-    return args
+    add_search_arguments(parser)
+    return parser
 
 
 # Helper functions for file type filtering
 
 
-def build_file_endings_filter(args: argparse.Namespace) -> list[str] | None:
+def build_file_endings_filter(args: argparse.Namespace) -> tuple[str, ...] | None:
     """
-    Build list of allowed file endings based on command-line args.
+    Build tuple of allowed file endings based on command-line args.
     Returns None if no filtering should be applied (--all flag without file types).
-    Returns list of endings for filtering by default or with specific flags.
+    Returns tuple of endings for filtering by default or with specific flags.
     Explicit file type flags take precedence over --all.
     """
     # Check if any explicit file type flags are specified
@@ -538,23 +542,79 @@ def build_file_endings_filter(args: argparse.Namespace) -> list[str] | None:
         if not args.no_index:
             selected_endings.extend(VCF_INDEX_ENDINGS)
 
-    return selected_endings if selected_endings else None
+    return tuple(selected_endings) if selected_endings else None
 
 
-def filter_by_file_endings(uri: str, endings: list[str] | None) -> bool:
+def filter_by_file_endings(uri: str, endings: tuple[str, ...] | None) -> bool:
     """
     Check if URI ends with one of the allowed endings.
     If endings is None, all URIs pass through (no filtering).
     Returns True if URI should be included in results.
+    No ending contains "/", so passing just the key of the URI gives the same result.
+    """
+    # str.endswith checks a whole tuple of suffixes in a single call.
+    return endings is None or uri.endswith(endings)
+
+
+def positive_int(value: str) -> int:
+    "Argument type for a count that must be at least 1."
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value!r}")
+    return number
+
+
+class VersionAction(argparse.Action):
     """
-    if endings is None:
-        return True
+    Like argparse's "version" action, but the version is only looked up when
+    --version is given, since that lookup is slow.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super().__init__(
+            option_strings, dest=dest, default=argparse.SUPPRESS, nargs=0, help=help
+        )
 
-    for ending in endings:
-        if uri.endswith(ending):
-            return True
+    def __call__(self, parser, namespace, values, option_string=None):
+        from . import __version__
 
-    return False
+        print(f"{parser.prog} {__version__}")
+        parser.exit()
+
+
+def add_search_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments shared by search-aws and search.py to an argument parser."""
+    parser.add_argument(
+        "-m",
+        "--max-results-per-query",
+        type=int,
+        default=10_000_000,
+        help="Maximum results per query (default: 10,000,000)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-root",
+        type=Path,
+        default=DEFAULT_OUTPUT_ROOT,
+        help="Output root directory containing the scan files "
+        f"(default: {DEFAULT_OUTPUT_ROOT})",
+    )
+    parser.add_argument(
+        "-u",
+        "--uri-only",
+        action="store_true",
+        help="Suppress all output except for the S3 URIs",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str,
+        default="WARNING",
+        help="Logging level (default: WARNING)",
+    )
+    add_file_type_filter_arguments(parser)
 
 
 def add_file_type_filter_arguments(parser: argparse.ArgumentParser) -> None:
@@ -609,45 +669,87 @@ def add_file_type_filter_arguments(parser: argparse.ArgumentParser) -> None:
     )
 
 
-def format_and_write_result(doc, uri_only: bool, output_file=None) -> None:
+def fast_exit(status: int) -> NoReturn:
+    """
+    Flush the standard streams and exit immediately, skipping interpreter teardown,
+    which can take longer than a search. Only for the end of a command line run.
+    """
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (BrokenPipeError, ValueError):
+            pass  # reader has gone away, or stream is already closed
+    os._exit(status)
+
+
+def write_results(
+    results: Iterable[tuple[float, Any]],
+    file_endings: tuple[str, ...] | None,
+    uri_only: bool,
+    output_file: TextIO,
+    lines: list[str] | None = None,
+) -> int:
+    """
+    Write the search results that pass the file ending filter, in batches.
+    Results are streamed, keeping only the current batch in memory.
+
+    Args:
+        results: (score, document) pairs from a search
+        file_endings: Allowed file endings, or None for no filtering
+        uri_only: If True, output only the S3 URIs
+        output_file: File handle to write to
+        lines: If not None, also collect the written lines here
+    Returns:
+        Number of results written
+    """
+    match_count = 0
+    batch = []
+    for _score, doc in results:
+        if filter_by_file_endings(doc.key, file_endings):
+            batch.append(format_result(doc, uri_only, "\n"))
+            match_count += 1
+            if len(batch) >= WRITE_BATCH_SIZE:
+                output_file.writelines(batch)
+                if lines is not None:
+                    lines.extend(batch)
+                batch.clear()
+    output_file.writelines(batch)
+    if lines is not None:
+        lines.extend(batch)
+    return match_count
+
+
+def open_output(path: Path) -> TextIO:
+    "Open a search.py output file for writing with a large buffer."
+    return open(path, "w", buffering=OUTPUT_BUFFER_SIZE)
+
+
+def format_result(doc, uri_only: bool, end: str = "") -> str:
     """
-    Format and write a search result document.
+    Format a search result document as one line.
 
     Args:
         doc: Document with bucket_name, key, size, last_modified, storage_class
         uri_only: If True, output only the S3 URI
-        output_file: File handle to write to, or None to print to stdout
+        end: String appended to the line, such as a newline
     """
-    bucket_name = doc.bucket_name
-    key = doc.key
-    s3_uri = f"s3://{bucket_name}/{key}"
-
+    # A single f-string per line is faster than building the URI separately.
     if uri_only:
-        line = s3_uri
-    else:
-        size = doc.size
-        last_modified = doc.last_modified
-        storage_class = doc.storage_class
-        line = f"{s3_uri}\t{size}\t{last_modified}\t{storage_class}"
-
-    if output_file is None:
-        print(line)
-    else:
-        output_file.write(f"{line}\n")
+        return f"s3://{doc.bucket_name}/{doc.key}{end}"
+    return (
+        f"s3://{doc.bucket_name}/{doc.key}\t{doc.size}"
+        f"\t{doc.last_modified}\t{doc.storage_class}{end}"
+    )
 
 
 def record_not_found_term(
-    term: str,
-    not_found_terms: list,
-    not_found_file,
-    not_found_list_file,
-    info_file,
+    term: str, not_found_file, not_found_list_file, info_file
 ) -> None:
     """Record a search term that had no matches in the output files."""
-    not_found_terms.append(term)
-    not_found_file.write(f"{term}\t0 matches\n")
+    line = f"{term}\t0 matches\n"
+    not_found_file.write(line)
     not_found_list_file.write(f"{term}\n")
-    info_file.write(f"{term}\t0 matches\n")
+    info_file.write(line)
 
 
 def warn_about_flag_conflicts(args: argparse.Namespace) -> None:
@@ -657,7 +759,7 @@ def warn_about_flag_conflicts(args: argparse.Namespace) -> None:
         print(
             "Warning: --max-results-per-query limit is applied before "
             "file type filtering. Use --all with -m for predictable results.",
-            file=stderr,
+            file=sys.stderr,
         )
 
     # Warn about --all with conflicting file type flags
@@ -673,5 +775,5 @@ def warn_about_flag_conflicts(args: argparse.Namespace) -> None:
     ):
         print(
             "Warning: File type flags specified; ignoring --all flag.",
-            file=stderr,
+            file=sys.stderr,
         )
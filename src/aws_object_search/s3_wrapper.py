@@ -1,26 +1,57 @@
 from collections.abc import Generator
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from functools import cache
+from itertools import chain
 from logging import getLogger
 from pathlib import Path
+from queue import Full, Queue
+from threading import Event
 
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from .catalog import S3ObjectCatalog
+from .constants import DEFAULT_MAX_WORKERS
 
 logger = getLogger(__name__)
 
+# Number of prefixes within one bucket to list concurrently
+DEFAULT_SHARD_WORKERS = 8
+# Number of pages per prefix to buffer ahead of the consumer
+SHARD_QUEUE_PAGES = 4
+
+# The pool size is set by get_s3_client, from the number of workers.
+S3_CLIENT_CONFIG = Config(
+    retries={"mode": "adaptive", "max_attempts": 10},
+    tcp_keepalive=True,
+    # Fail fast on a stalled connection and let the retries try again.
+    connect_timeout=5,
+)
+
+# Errors that affect only one bucket, so the scan skips it and continues
+SKIPPED_BUCKET_ERROR_CODES = {"AccessDenied", "NoSuchBucket", "PermanentRedirect"}
+
 
 def run_s3_object_scan(
     output_root: str | Path,
     bucket_prefix: str | None = None,
     tsv_file_prefix: str | None = None,
     s3_client=None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    shard_prefixes: bool = False,
 ) -> None:
     """
     Run a scan of S3 buckets and output their objects to TSV files.
+    Buckets are scanned concurrently, since listing is bound by S3 latency.
     :param output_root: Output root directory for generated files
     :param bucket_prefix: Optional prefix to filter bucket names
     :param tsv_file_prefix: Optional value to use instead of timestamp in TSV file names
     :param s3_client: Optional Boto3 S3 client
+    :param max_workers: Maximum number of buckets to scan at the same time
+    :param shard_prefixes: List the top-level prefixes of each bucket concurrently
     """
     if not isinstance(output_root, str | Path):
         raise TypeError(
@@ -29,28 +60,86 @@ def run_s3_object_scan(
     if not isinstance(bucket_prefix, str | type(None)):
         raise TypeError("Bucket prefix must be a string or None")
 
+    if s3_client is None:
+        # Enough pooled connections for every bucket and prefix worker to keep its
+        # own, since urllib3 discards the connections that do not fit in the pool.
+        shard_workers = DEFAULT_SHARD_WORKERS if shard_prefixes else 1
+        s3_client = get_s3_client(max_workers * shard_workers)
     scanner = BucketScanner(s3_client)
     writer = S3ObjectCatalog(output_root)
+    writer.remove_partial_files()
+    if not tsv_file_prefix:
+        # One timestamp for the whole scan, so that all its files share it.
+        tsv_file_prefix = datetime.now().strftime("%Y%m%d-%H%M%S")
 
-    buckets = scanner.list_buckets_with_prefix(bucket_prefix)
-    for bucket in buckets:
+    # Set when the scan ends, including on an interrupt, to stop unfinished buckets
+    cancelled = Event()
+
+    def scan_bucket(bucket: str) -> None:
+        if cancelled.is_set():
+            return
         logger.info(f"Scanning bucket: {bucket}")
-        s3_objects = scanner.get_bucket_objects(bucket)
-        writer.output_s3_objects_to_tsv(s3_objects, bucket, tsv_file_prefix)
+        if shard_prefixes:
+            pages = scanner.get_bucket_object_pages_sharded(bucket)
+        else:
+            pages = scanner.get_bucket_object_pages(bucket)
+        s3_objects = _flatten_pages(_pages_until_cancelled(pages, cancelled))
+        try:
+            # Closing stops any listing still running if the writer fails.
+            with closing(s3_objects):
+                writer.output_s3_objects_to_tsv(s3_objects, bucket, tsv_file_prefix)
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            if error_code not in SKIPPED_BUCKET_ERROR_CODES:
+                raise
+            logger.warning(f"Skipping bucket {bucket}: {e}")
+
+    buckets = scanner.list_buckets_with_prefix(bucket_prefix)
+    # Boto3 clients are thread safe, so the workers share the scanner's client.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            # Consume the results to propagate any exception raised by a worker.
+            list(executor.map(scan_bucket, buckets))
+        finally:
+            # Otherwise leaving the with block waits for every bucket to finish.
+            cancelled.set()
     logger.info("Scan completed successfully.")
 
 
+@cache
+def get_s3_client(
+    max_pool_connections: int = DEFAULT_MAX_WORKERS * DEFAULT_SHARD_WORKERS,
+):
+    """
+    Return the S3 client shared by every scanner in this process that uses the
+    same pool size.
+    :param max_pool_connections: Maximum number of connections to keep open
+    """
+    # Resolved here rather than at import, since the version lookup is slow.
+    from . import __version__
+
+    config = S3_CLIENT_CONFIG.merge(
+        Config(
+            max_pool_connections=max_pool_connections,
+            user_agent_extra=f"aws-object-search/{__version__}",
+        )
+    )
+    return boto3.session.Session().client("s3", config=config)
+
+
 class BucketScanner:
     """
     Class to scan S3 buckets and iterate their objects.
     """
 
+    __slots__ = ("s3_client",)
+
     def __init__(self, s3_client=None):
         """
         Initialize the BucketScanner with an optional S3 client.
         :param s3_client: Boto3 S3 client
         """
-        self.s3_client = s3_client or boto3.client("s3")
+        self.s3_client = s3_client or get_s3_client()
 
     def list_buckets_with_prefix(self, prefix: str | None = None) -> list[str]:
         """
@@ -67,15 +156,178 @@ class BucketScanner:
         buckets = response.get("Buckets", [])
         return [b["Name"] for b in buckets]
 
-    def get_bucket_objects(self, bucket_name: str) -> Generator[dict, None, None]:
+    def get_bucket_objects(
+        self, bucket_name: str, prefix: str = "", start_after: str = ""
+    ) -> Generator[dict, None, None]:
         """
         Get all objects in an S3 bucket as a generator.
+        Closing the generator stops the listing.
         :param bucket_name: Name of the S3 bucket
+        :param prefix: Optional prefix to limit the listing to matching keys
+        :param start_after: Optional key to start listing after, to resume a listing
         :yield: All objects in the bucket
         """
+        pages = self.get_bucket_object_pages(bucket_name, prefix, start_after)
+        yield from _flatten_pages(pages)
+
+    def get_bucket_object_pages(
+        self, bucket_name: str, prefix: str = "", start_after: str = ""
+    ) -> Generator[list[dict], None, None]:
+        """
+        Get the objects in an S3 bucket one page (up to 1000 objects) at a time.
+        :param bucket_name: Name of the S3 bucket
+        :param prefix: Optional prefix to limit the listing to matching keys
+        :param start_after: Optional key to start listing after, to resume a listing
+        :yield: Lists of objects in the bucket
+        """
+        for page in self.get_bucket_pages(bucket_name, prefix, start_after=start_after):
+            yield page.get("Contents", [])
+
+    def get_bucket_pages(
+        self,
+        bucket_name: str,
+        prefix: str = "",
+        delimiter: str = "",
+        start_after: str = "",
+    ) -> Generator[dict, None, None]:
+        """
+        Get all ListObjectsV2 response pages for an S3 bucket as a generator.
+        The next page is requested while the caller processes the current page.
+        :param bucket_name: Name of the S3 bucket
+        :param prefix: Optional prefix to limit the listing to matching keys
+        :param delimiter: Optional delimiter for grouping keys into CommonPrefixes
+        :param start_after: Optional key to start listing after, to resume a listing
+        :yield: ListObjectsV2 responses
+        """
         if not isinstance(bucket_name, str):
             raise TypeError("Bucket name must be a string")
-        paginator = self.s3_client.get_paginator("list_objects_v2")
-        page_iterable = paginator.paginate(Bucket=bucket_name)
-        for page in page_iterable:
-            yield from page.get("Contents", [])
+        list_objects = self.s3_client.list_objects_v2
+        kwargs = {"Bucket": bucket_name, "MaxKeys": 1000}
+        if prefix:
+            kwargs["Prefix"] = prefix
+        if delimiter:
+            kwargs["Delimiter"] = delimiter
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        page_count = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(list_objects, **kwargs)
+            while future is not None:
+                page = future.result()
+                page_count += 1
+                if page.get("IsTruncated"):
+                    token = page["NextContinuationToken"]
+                    future = executor.submit(
+                        list_objects, **kwargs, ContinuationToken=token
+                    )
+                else:
+                    future = None
+                yield page
+        logger.debug(f"Listed {page_count} pages from s3://{bucket_name}/{prefix}")
+
+    def get_bucket_objects_sharded(
+        self, bucket_name: str, max_workers: int = DEFAULT_SHARD_WORKERS
+    ) -> Generator[dict, None, None]:
+        """
+        Get all objects in an S3 bucket as a generator, listing the top-level
+        prefixes ("directories") of the bucket concurrently. This speeds up the
+        scan of a large bucket. Objects at the top level come first, followed by
+        the objects under each prefix in order.
+        Closing the generator stops the listing and its workers.
+        :param bucket_name: Name of the S3 bucket
+        :param max_workers: Maximum number of prefixes to list at the same time
+        :yield: All objects in the bucket
+        """
+        pages = self.get_bucket_object_pages_sharded(bucket_name, max_workers)
+        yield from _flatten_pages(pages)
+
+    def get_bucket_object_pages_sharded(
+        self, bucket_name: str, max_workers: int = DEFAULT_SHARD_WORKERS
+    ) -> Generator[list[dict], None, None]:
+        """
+        Get the objects in an S3 bucket one page at a time, listing the top-level
+        prefixes of the bucket concurrently. See get_bucket_objects_sharded.
+        :param bucket_name: Name of the S3 bucket
+        :param max_workers: Maximum number of prefixes to list at the same time
+        :yield: Lists of objects in the bucket
+        """
+        prefixes = []
+        for page in self.get_bucket_pages(bucket_name, delimiter="/"):
+            yield page.get("Contents", [])
+            prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+        if not prefixes:
+            return
+
+        # Each prefix gets a bounded queue of pages, so that memory use stays
+        # bounded while listing runs ahead of the consumer.
+        page_queues = [Queue(maxsize=SHARD_QUEUE_PAGES) for _ in prefixes]
+        stop = Event()  # The consumer is gone
+        failed = Event()  # A prefix failed, so the consumer will raise
+
+        def put(page_queue: Queue, item) -> bool:
+            "Put item on page_queue unless stopped. Return False if stopped."
+            while not stop.is_set():
+                try:
+                    page_queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def list_prefix(prefix: str, page_queue: Queue) -> None:
+            # Prefixes start in order, so one that starts after a failure comes
+            # after the failed prefix, and the consumer never reads its queue.
+            if stop.is_set() or failed.is_set():
+                return
+            try:
+                for page in self.get_bucket_pages(bucket_name, prefix):
+                    if not put(page_queue, page.get("Contents", [])):
+                        return
+            except Exception as e:
+                failed.set()
+                put(page_queue, e)
+            else:
+                put(page_queue, None)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                for prefix, page_queue in zip(prefixes, page_queues, strict=True):
+                    executor.submit(list_prefix, prefix, page_queue)
+                for page_queue in page_queues:
+                    while (contents := page_queue.get()) is not None:
+                        if isinstance(contents, Exception):
+                            raise contents
+                        yield contents
+            finally:
+                # Release any workers still running, for example after an error,
+                # and drop the prefixes not yet started.
+                stop.set()
+                executor.shutdown(cancel_futures=True)
+
+
+def _flatten_pages(
+    pages: Generator[list[dict], None, None],
+) -> Generator[dict, None, None]:
+    "Generate the objects of each page, and close pages when this is closed."
+    try:
+        # chain flattens the pages in C, without resuming a generator per object.
+        yield from chain.from_iterable(pages)
+    finally:
+        # yield from cannot pass close() through chain, so close pages directly.
+        pages.close()
+
+
+def _pages_until_cancelled(
+    pages: Generator[list[dict], None, None], cancelled: Event
+) -> Generator[list[dict], None, None]:
+    """
+    Generate pages until cancelled is set, then raise CancelledError, so that the
+    catalog removes the incomplete file. Close pages when this is closed.
+    """
+    try:
+        for page in pages:
+            if cancelled.is_set():
+                raise CancelledError
+            yield page
+    finally:
+        pages.close()
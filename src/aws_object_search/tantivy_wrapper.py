@@ -1,7 +1,11 @@
 """Business logic around tantivy."""
 
+import os
+from collections import deque
 from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import cache
 from logging import getLogger
 from pathlib import Path
 from shutil import rmtree
@@ -12,6 +16,13 @@ from .catalog import S3ObjectCatalog
 
 logger = getLogger(__name__)
 
+# Number of queries to search concurrently; tantivy releases the GIL while searching
+DEFAULT_SEARCH_WORKERS = min(32, os.cpu_count() or 1)
+
+# Total memory for the index writer, split among its threads. A larger heap means
+# fewer segments to flush and merge while indexing a full catalog.
+DEFAULT_WRITER_HEAP_SIZE = 512 * 1024 * 1024
+
 
 @dataclass
 class S3ObjectResult:
@@ -28,6 +39,13 @@ class S3ObjectResult:
     key: str = "MISSING"
 
 
+# All stored fields of a result, in S3ObjectResult order
+RESULT_FIELDS = tuple(S3ObjectResult.__dataclass_fields__)
+
+# Stored fields needed for S3 URIs, for searches that only output URIs
+URI_FIELDS = ("bucket_name", "key")
+
+
 def search_index_simple(
     index_path: Path | str,
     query: str,
@@ -35,9 +53,9 @@ def search_index_simple(
     max_results: int = 1000,
 ) -> None:
     "Search for query with simple output format for search-aws."
-    results = list(run_query(index_path, query, max_results))
-
-    for _score, doc in results:
+    fields = URI_FIELDS if uri_only else None
+    # Print each result as it is read, without collecting them all first.
+    for _score, doc in run_query(index_path, query, max_results, fields):
         bucket_name = doc.bucket_name
         key = doc.key
         s3_uri = f"s3://{bucket_name}/{key}"
@@ -51,29 +69,115 @@ def search_index_simple(
 
 
 def run_query(
-    index_path: Path | str, query_str: str, max_results: int = 1000
+    index_path: Path | str,
+    query_str: str,
+    max_results: int = 1000,
+    fields: Iterable[str] | None = None,
 ) -> Iterable[tuple[float, S3ObjectResult]]:
-    "Search for query and generate (score, S3ObjectResult) pairs."
+    """
+    Search for query and generate (score, S3ObjectResult) pairs.
+    Only the stored fields named in fields are read, if fields is given.
+    """
+    index, searcher = open_searcher(index_path)
+    yield from search_hits(index, searcher, query_str, max_results, fields)
+
+
+def run_queries(
+    index_path: Path | str,
+    query_strs: Iterable[str],
+    max_results: int = 1000,
+    max_workers: int = DEFAULT_SEARCH_WORKERS,
+    fields: Iterable[str] | None = None,
+) -> Iterable[tuple[str, Iterable[tuple[float, S3ObjectResult]]]]:
+    """
+    Search for each query, opening the index and its searcher only once.
+    Queries are searched concurrently, a bounded number ahead of the consumer,
+    but the results are generated in the order of query_strs.
+    The index is opened immediately, so errors opening it are raised here.
+    :param index_path: Path to the index directory
+    :param query_strs: Queries to run in order
+    :param max_results: Maximum number of results per query
+    :param max_workers: Maximum number of queries to search at the same time
+    :param fields: Optional names of the only stored fields to read for each result
+    :return: Generator of (query_str, results) pairs, where results generates
+        (score, S3ObjectResult) pairs
+    """
+    index, searcher = open_searcher(index_path)
+    return _run_queries(index, searcher, query_strs, max_results, max_workers, fields)
+
+
+def _run_queries(
+    index: tantivy.Index,
+    searcher: tantivy.Searcher,
+    query_strs: Iterable[str],
+    max_results: int,
+    max_workers: int,
+    fields: Iterable[str] | None,
+) -> Iterable[tuple[str, Iterable[tuple[float, S3ObjectResult]]]]:
+    "Search concurrently and generate (query_str, results) in order. See run_queries."
+
+    def search(query_str: str) -> tantivy.SearchResult:
+        query_obj = index.parse_query(query_str, ["key"])
+        return searcher.search(query_obj, max_results)
+
+    def future_hits(future: Future) -> Iterable[tuple[float, S3ObjectResult]]:
+        # Errors from the search are raised when the results are consumed.
+        yield from iter_results(searcher, future.result(), fields)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for query_str in query_strs:
+            pending.append((query_str, executor.submit(search, query_str)))
+            if len(pending) > 2 * max_workers:
+                query_str, future = pending.popleft()
+                yield query_str, future_hits(future)
+        while pending:
+            query_str, future = pending.popleft()
+            yield query_str, future_hits(future)
+
+
+def open_searcher(index_path: Path | str) -> tuple[tantivy.Index, tantivy.Searcher]:
+    "Open the index at index_path and return it with a searcher."
     schema = build_schema()
     index = tantivy.Index(schema, str(index_path))
+    return index, index.searcher()
+
+
+def search_hits(
+    index: tantivy.Index,
+    searcher: tantivy.Searcher,
+    query_str: str,
+    max_results: int,
+    fields: Iterable[str] | None = None,
+) -> Iterable[tuple[float, S3ObjectResult]]:
+    "Search for query with an open searcher and generate (score, S3ObjectResult)."
     query_obj = index.parse_query(query_str, ["key"])
-    searcher = index.searcher()
-    results = searcher.search(query_obj, max_results)
+    yield from iter_results(searcher, searcher.search(query_obj, max_results), fields)
 
+
+def iter_results(
+    searcher: tantivy.Searcher,
+    results: tantivy.SearchResult,
+    fields: Iterable[str] | None = None,
+) -> Iterable[tuple[float, S3ObjectResult]]:
+    """
+    Generate (score, S3ObjectResult) pairs from the hits of a search.
+    Only the stored fields named in fields are read, if fields is given.
+    The other fields of each result keep their default values.
+    """
+    fields = RESULT_FIELDS if fields is None else tuple(fields)
     for score, address in results.hits:
         doc = searcher.doc(address)
-        doc_dict = doc.to_dict()
 
         # Create S3ObjectResult with default values
         result = S3ObjectResult()
 
-        # Update fields from document
-        for field in result.__dataclass_fields__:
-            if field in doc_dict:
-                value_list = doc_dict[field]
-                if len(value_list) != 1:
-                    logger.warning(f"abnormal value list for {field} in {doc_dict}")
-                setattr(result, field, ";".join(doc_dict[field]))
+        # Update fields from document. regenerate_index() stores exactly one value
+        # per field, so get_first() passes each as a plain str, without a list.
+        for field in fields:
+            value = doc.get_first(field)
+            if value is not None:
+                setattr(result, field, value)
 
         yield score, result
 
@@ -86,16 +190,29 @@ def index_catalog(catalog_root: Path, index_path: Path) -> None:
     catalog.archive_old_scans()
 
 
-def regenerate_index(index_path: Path, documents: Iterable[dict[str, str]]) -> None:
-    "Populate a new index, replacing any existing index."
+def regenerate_index(
+    index_path: Path,
+    documents: Iterable[dict[str, str]],
+    heap_size: int = DEFAULT_WRITER_HEAP_SIZE,
+    num_threads: int = 0,
+) -> None:
+    """
+    Populate a new index, replacing any existing index.
+    The writer uses heap_size bytes of memory in total and num_threads indexing
+    threads, where 0 lets tantivy choose based on the number of CPUs.
+    All documents are committed once, at the end. Committing more often would
+    make more, smaller segments to merge, and would expose a partial index.
+    """
     # TODO: avoid external race condition.
     schema = build_schema()
     if index_path.is_dir():
         rmtree(index_path)
     index = create_index(schema, index_path)
-    writer = index.writer()
+    writer = index.writer(heap_size=heap_size, num_threads=num_threads)
+    # from_dict converts each dict directly, without unpacking it into keywords.
+    from_dict = tantivy.Document.from_dict
     for d in documents:
-        writer.add_document(tantivy.Document(**d))
+        writer.add_document(from_dict(d))
     writer.commit()
     writer.wait_merging_threads()
 
@@ -126,8 +243,9 @@ def _fix_tantivy_permissions(index_path: Path) -> None:
         os.chmod(meta_lock_path, 0o666)
 
 
+@cache
 def build_schema() -> tantivy.Schema:
-    "Return schema matching scan output."
+    "Return schema matching scan output. The schema is built once and shared."
     schema_builder = tantivy.SchemaBuilder()
     schema_builder.add_text_field("last_scan_timestamp", stored=True)
     schema_builder.add_text_field("bucket_name", stored=True)
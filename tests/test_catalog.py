@@ -1,9 +1,19 @@
 import csv
+import errno
+import io
+import os
+from datetime import datetime
 from pathlib import PurePosixPath
 
-from pytest import fixture
+from pytest import fixture, raises
 
-from aws_object_search.catalog import S3ObjectCatalog
+from aws_object_search.catalog import (
+    BucketScan,
+    S3ObjectCatalog,
+    flatten,
+    move_file,
+    write_tsv_rows,
+)
 
 
 @fixture
@@ -32,6 +42,12 @@ def test_list_catalog(simple_catalog):
     assert computed == expected
 
 
+def test_list_catalog_missing_root(tmp_path):
+    "A catalog whose root does not exist yet has no scans"
+    catalog = S3ObjectCatalog(tmp_path / "missing")
+    assert list(catalog.all_bucket_scans()) == []
+
+
 def test_list_objects(simple_catalog):
     "Read some object metadata"
     catalog = simple_catalog
@@ -45,14 +61,15 @@ def test_list_objects(simple_catalog):
         "H575JDSXX-1-IDUDI0003_S30_L001_R2_001.fastq.gz",
         "v1/illumina/wex/fastqs/Sample_H575JDSXX-1-IDUDI0003/SEDefn.json",
     ]
-    computed_keys = [obj_meta.key for obj_meta in target_scan.contents()]
+    contents = list(target_scan.contents())
+    computed_keys = [obj_meta.key for obj_meta in contents]
     assert computed_keys == expected_keys
     expected_sizes = [
         "2869776186",
         "2873774843",
         "1407",
     ]
-    computed_sizes = [obj_meta.size for obj_meta in target_scan.contents()]
+    computed_sizes = [obj_meta.size for obj_meta in contents]
     assert computed_sizes == expected_sizes
 
 
@@ -286,3 +303,99 @@ def test_archive_no_old_scans(tmp_path) -> None:
     # No archive directory should be created
     archive_root = test_catalog_root / "archive"
     assert not archive_root.exists()
+
+
+def test_output_s3_objects_to_tsv_partial(tmp_path) -> None:
+    "A scan in progress is written under a name the catalog does not read"
+    catalog = S3ObjectCatalog(tmp_path)
+
+    def objects():
+        yield {"Key": "a.txt", "Size": 1, "LastModified": "2025-05-05T16:48:32"}
+        names = sorted(p.name for p in tmp_path.iterdir())
+        assert names == ["20250505-164832-test-bucket.tsv.gz.partial"]
+        assert list(catalog.all_bucket_scans()) == []
+
+    catalog.output_s3_objects_to_tsv(objects(), "test-bucket", "20250505-164832")
+    names = [p.name for p in tmp_path.iterdir()]
+    assert names == ["20250505-164832-test-bucket.tsv.gz"]
+
+
+def test_remove_partial_files(tmp_path) -> None:
+    "Partial files left by a killed scan are removed, and nothing else"
+    names = ["20250505-164832-a.tsv.gz.partial", "20250505-164832-b.tsv.gz"]
+    for name in names:
+        (tmp_path / name).touch()
+    S3ObjectCatalog(tmp_path).remove_partial_files()
+    assert [p.name for p in tmp_path.iterdir()] == ["20250505-164832-b.tsv.gz"]
+
+
+def test_remove_partial_files_missing_root(tmp_path) -> None:
+    "There is nothing to remove before the first scan creates the catalog"
+    S3ObjectCatalog(tmp_path / "missing").remove_partial_files()
+
+
+def test_flatten_str() -> None:
+    "Quotes around a value are stripped, and short values are left alone"
+    assert (
+        flatten('"a65f5b56909bf63398213ae450a879fb"')
+        == "a65f5b56909bf63398213ae450a879fb"
+    )
+    assert flatten("DEEP_ARCHIVE") == "DEEP_ARCHIVE"
+    assert flatten("") == ""
+    assert flatten('"') == '"'
+
+
+def test_write_tsv_rows_matches_csv_writer() -> None:
+    "Rows are written exactly as csv.writer writes them, including quoted keys"
+    keys = ["a/b.txt", "tab\tkey", 'quote"key', '"leading', "new\nline", "cr\rkey", ""]
+    rows = [["2025-05-05T16:48:32", "100", "STANDARD", key] for key in keys]
+    expected = io.StringIO(newline="")
+    csv.writer(expected, delimiter="\t").writerows(rows)
+    actual = io.StringIO(newline="")
+    write_tsv_rows(actual, csv.writer(actual, delimiter="\t"), rows)
+    assert actual.getvalue() == expected.getvalue()
+
+
+def test_output_s3_objects_to_tsv_root_not_dir(tmp_path) -> None:
+    "The catalog root must be a directory"
+    catalog_root = tmp_path / "catalog"
+    catalog_root.write_text("not a directory")
+    catalog = S3ObjectCatalog(catalog_root)
+    with raises(ValueError, match="must be a directory"):
+        catalog.output_s3_objects_to_tsv([], "test-bucket", "20250505-164832")
+
+
+def test_all_bucket_scans_skips_directories(tmp_path) -> None:
+    "Only files are scans, even if a directory has a matching name"
+    (tmp_path / "20250505-164832-hgsc-a.tsv").mkdir()
+    (tmp_path / "20250505-164832-hgsc-b.tsv").write_text("key\n")
+    scans = S3ObjectCatalog(tmp_path).all_bucket_scans()
+    assert [scan.bucket_name for scan in scans] == ["hgsc-b"]
+
+
+def test_bucket_scan_dotted_bucket_name(tmp_path) -> None:
+    "Bucket names may contain dots"
+    scan = BucketScan(tmp_path / "20250505-164832-hgsc.example.org.tsv.gz")
+    assert scan.bucket_name == "hgsc.example.org"
+    assert scan.scan_start == datetime(2025, 5, 5, 16, 48, 32)
+
+
+def test_bucket_scan_bad_name(tmp_path) -> None:
+    "A file that is not named like a scan is rejected"
+    with raises(ValueError, match="unrecognized scan file name"):
+        BucketScan(tmp_path / "hgsc-a.tsv")
+
+
+def test_move_file_across_filesystems(tmp_path, monkeypatch) -> None:
+    "A file is copied when it cannot be renamed to another filesystem"
+
+    def replace(source, target):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr("aws_object_search.catalog.os.replace", replace)
+    source = tmp_path / "source.tsv"
+    source.write_text("data")
+    target = tmp_path / "target.tsv"
+    move_file(source, target)
+    assert not source.exists()
+    assert target.read_text() == "data"
@@ -1,10 +1,14 @@
 import argparse
 import fcntl
 import multiprocessing
+import os
+import subprocess
+import sys
 import time
 
 import pytest
 
+from aws_object_search import __version__, entry
 from aws_object_search.entry import (
     BAM_ENDINGS,
     BAM_INDEX_ENDINGS,
@@ -17,7 +21,13 @@ from aws_object_search.entry import (
     aos_scan,
     build_file_endings_filter,
     filter_by_file_endings,
+    parse_scan_args,
+    parse_search_aws_args,
+    parse_search_py_args,
+    search_aws,
+    search_py,
 )
+from aws_object_search.tantivy_wrapper import regenerate_index
 
 
 @pytest.mark.integration
@@ -30,6 +40,8 @@ def test_aos_scan_smoke(tmp_path):
         no_scan=False,
         no_index=False,
         flock=None,
+        jobs=2,
+        shard_prefixes=False,
     )
     aos_scan(args)
 
@@ -64,8 +76,8 @@ def test_aos_scan_with_lock_acquired(tmp_path):
     )
     # Should complete without error and create lock file
     aos_scan(args)
-    # Lock file should exist after scan
-    assert lock_file.exists()
+    # Lock file should exist after scan, recording the PID of the holder
+    assert lock_file.read_text() == f"{os.getpid()}\n"
 
 
 def test_aos_scan_lock_blocking(tmp_path):
@@ -75,6 +87,8 @@ def test_aos_scan_lock_blocking(tmp_path):
     # Acquire lock in this process
     with open(lock_file, "w") as lf:
         fcntl.flock(lf.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        lf.write("holder\n")
+        lf.flush()
 
         # Try to run aos_scan with the same lock file (should fail)
         args = argparse.Namespace(
@@ -90,6 +104,8 @@ def test_aos_scan_lock_blocking(tmp_path):
         with pytest.raises(SystemExit) as exc_info:
             aos_scan(args)
         assert exc_info.value.code == 2
+        # The holder's lock file is left untouched
+        assert lock_file.read_text() == "holder\n"
 
 
 def test_aos_scan_lock_critical_message(tmp_path, caplog):
@@ -451,15 +467,15 @@ def test_filter_by_file_endings_none():
     assert filter_by_file_endings("s3://bucket/path/random.xyz", None) is True
 
 
-def test_filter_by_file_endings_empty_list():
-    """Test that empty list blocks all URIs."""
-    assert filter_by_file_endings("s3://bucket/file.txt", []) is False
-    assert filter_by_file_endings("s3://bucket/file.fastq.gz", []) is False
+def test_filter_by_file_endings_empty_tuple():
+    """Test that empty tuple blocks all URIs."""
+    assert filter_by_file_endings("s3://bucket/file.txt", ()) is False
+    assert filter_by_file_endings("s3://bucket/file.fastq.gz", ()) is False
 
 
 def test_filter_by_file_endings_fastq():
     """Test filtering FASTQ files."""
-    endings = [".fastq.gz", "_001.fastq.gz"]
+    endings = (".fastq.gz", "_001.fastq.gz")
     assert filter_by_file_endings("s3://bucket/sample_R1_001.fastq.gz", endings) is True
     assert filter_by_file_endings("s3://bucket/sample.fastq.gz", endings) is True
     assert filter_by_file_endings("s3://bucket/sample.bam", endings) is False
@@ -467,7 +483,7 @@ def test_filter_by_file_endings_fastq():
 
 def test_filter_by_file_endings_bam():
     """Test filtering BAM files."""
-    endings = ["_realigned.bam", ".hgv.bam", "bam.bai"]
+    endings = ("_realigned.bam", ".hgv.bam", "bam.bai")
     assert filter_by_file_endings("s3://bucket/sample_realigned.bam", endings) is True
     assert filter_by_file_endings("s3://bucket/sample.hgv.bam", endings) is True
     assert filter_by_file_endings("s3://bucket/sample.bam.bai", endings) is True
@@ -476,7 +492,7 @@ def test_filter_by_file_endings_bam():
 
 def test_filter_by_file_endings_vcf():
     """Test filtering VCF files."""
-    endings = [".SNPs_Annotated.vcf", "_snp.vcf.gz", "vcf.gz.tbi"]
+    endings = (".SNPs_Annotated.vcf", "_snp.vcf.gz", "vcf.gz.tbi")
     assert (
         filter_by_file_endings("s3://bucket/sample.SNPs_Annotated.vcf", endings) is True
     )
@@ -487,7 +503,7 @@ def test_filter_by_file_endings_vcf():
 
 def test_filter_by_file_endings_config():
     """Test filtering config files."""
-    endings = ["config.txt", "event.json", "FCDefn.json"]
+    endings = ("config.txt", "event.json", "FCDefn.json")
     assert filter_by_file_endings("s3://bucket/run/config.txt", endings) is True
     assert filter_by_file_endings("s3://bucket/run/event.json", endings) is True
     assert filter_by_file_endings("s3://bucket/run/FCDefn.json", endings) is True
@@ -496,14 +512,242 @@ def test_filter_by_file_endings_config():
 
 def test_filter_by_file_endings_case_sensitive():
     """Test that filtering is case-sensitive."""
-    endings = [".fastq.gz"]
+    endings = (".fastq.gz",)
     assert filter_by_file_endings("s3://bucket/sample.fastq.gz", endings) is True
     assert filter_by_file_endings("s3://bucket/sample.FASTQ.GZ", endings) is False
 
 
 def test_filter_by_file_endings_partial_match():
     """Test that only complete suffix matches work."""
-    endings = [".bam"]
+    endings = (".bam",)
     assert filter_by_file_endings("s3://bucket/sample.bam", endings) is True
     # Should not match "bam" in the middle of the filename
     assert filter_by_file_endings("s3://bucket/bamboo.txt", endings) is False
+
+
+def test_file_endings_have_no_slash():
+    """Test that filtering a key gives the same result as filtering its URI."""
+    all_endings = (
+        RAW_READS_ENDINGS
+        + CONFIG_ENDINGS
+        + BAM_ENDINGS
+        + CRAM_ENDINGS
+        + VCF_ENDINGS
+        + BAM_INDEX_ENDINGS
+        + CRAM_INDEX_ENDINGS
+        + VCF_INDEX_ENDINGS
+    )
+    assert not any("/" in ending for ending in all_endings)
+
+
+# Tests for search_py
+
+
+@pytest.fixture
+def search_output_root(tmp_path):
+    """Output root with a small index for searching."""
+    documents = [
+        {
+            "last_scan_timestamp": "2025-05-04T16:48:32",
+            "bucket_name": "hgsc-a",
+            "last_modified": "2025-03-31T01:37:05+00:00",
+            "size": str(size),
+            "storage_class": "DEEP_ARCHIVE",
+            "e_tag": "abc123",
+            "checksum_algorithm": "SHA256",
+            "checksum_type": "FULL_OBJECT",
+            "key": key,
+        }
+        for size, key in enumerate(
+            [
+                "v1/SAMPLE1/SAMPLE1_R1_001.fastq.gz",
+                "v1/SAMPLE1/SAMPLE1_R2_001.fastq.gz",
+                "v1/SAMPLE1/SAMPLE1.md5",
+                "v1/SAMPLE2/SAMPLE2.hgv.bam",
+            ]
+        )
+    ]
+    output_root = tmp_path / "s3_objects"
+    output_root.mkdir()
+    regenerate_index(output_root / "index", documents)
+    return output_root
+
+
+def make_search_py_args(output_root, input_file, **kwargs) -> argparse.Namespace:
+    """Return arguments for search_py with defaults for all options."""
+    defaults = {
+        "file": str(input_file),
+        "output_root": output_root,
+        "max_results_per_query": 10_000_000,
+        "uri_only": False,
+        "log_level": "ERROR",
+        "all": False,
+        "raw_reads": False,
+        "mapped_reads": False,
+        "bam": False,
+        "cram": False,
+        "vcf": False,
+        "configs": False,
+        "no_index": False,
+    }
+    return argparse.Namespace(**(defaults | kwargs))
+
+
+def test_search_py(tmp_path, search_output_root):
+    """Test search_py output files for found and missing terms."""
+    input_file = tmp_path / "terms.txt"
+    input_file.write_text("SAMPLE1\n\nMISSING\nSAMPLE2\n")
+    args = make_search_py_args(search_output_root, input_file)
+    with pytest.raises(SystemExit) as exc_info:
+        search_py(args)
+    assert exc_info.value.code == 0
+
+    out_lines = (tmp_path / "terms.txt.out.tsv").read_text().splitlines()
+    assert out_lines == [
+        "s3://hgsc-a/v1/SAMPLE1/SAMPLE1_R1_001.fastq.gz\t0\t"
+        "2025-03-31T01:37:05+00:00\tDEEP_ARCHIVE",
+        "s3://hgsc-a/v1/SAMPLE1/SAMPLE1_R2_001.fastq.gz\t1\t"
+        "2025-03-31T01:37:05+00:00\tDEEP_ARCHIVE",
+        "s3://hgsc-a/v1/SAMPLE2/SAMPLE2.hgv.bam\t3\t"
+        "2025-03-31T01:37:05+00:00\tDEEP_ARCHIVE",
+    ]
+    info_lines = (tmp_path / "terms.txt.out.info").read_text().splitlines()
+    assert info_lines[3:] == [
+        "SAMPLE1\t2 matches",
+        "MISSING\t0 matches",
+        "SAMPLE2\t1 matches",
+        "# Total matches found: 3",
+        "# Terms with no matches: 1",
+    ]
+    assert (tmp_path / "terms.txt.not_found.txt").read_text() == "MISSING\t0 matches\n"
+    assert (tmp_path / "terms.txt.not_found.list").read_text() == "MISSING\n"
+
+
+def test_search_py_uri_only_all(tmp_path, search_output_root):
+    """Test search_py with --uri-only and --all."""
+    input_file = tmp_path / "terms.txt"
+    input_file.write_text("SAMPLE1\n")
+    args = make_search_py_args(search_output_root, input_file, uri_only=True, all=True)
+    with pytest.raises(SystemExit):
+        search_py(args)
+    out_lines = (tmp_path / "terms.txt.out.tsv").read_text().splitlines()
+    assert sorted(out_lines) == [
+        "s3://hgsc-a/v1/SAMPLE1/SAMPLE1.md5",
+        "s3://hgsc-a/v1/SAMPLE1/SAMPLE1_R1_001.fastq.gz",
+        "s3://hgsc-a/v1/SAMPLE1/SAMPLE1_R2_001.fastq.gz",
+    ]
+
+
+def test_search_py_repeated_terms(tmp_path, search_output_root, monkeypatch):
+    """Test search_py searches a repeated term once and repeats its output."""
+    searched = []
+    real_run_queries = entry.run_queries
+
+    def spy_run_queries(index_path, query_strs, max_results, **kwargs):
+        searched.extend(query_strs)
+        return real_run_queries(index_path, query_strs, max_results, **kwargs)
+
+    monkeypatch.setattr(entry, "run_queries", spy_run_queries)
+    input_file = tmp_path / "terms.txt"
+    input_file.write_text("SAMPLE2\nMISSING\nSAMPLE2\nMISSING\n")
+    args = make_search_py_args(search_output_root, input_file, uri_only=True)
+    with pytest.raises(SystemExit):
+        search_py(args)
+    assert searched == ["SAMPLE2", "MISSING"]
+    assert (tmp_path / "terms.txt.out.tsv").read_text().splitlines() == [
+        "s3://hgsc-a/v1/SAMPLE2/SAMPLE2.hgv.bam",
+        "s3://hgsc-a/v1/SAMPLE2/SAMPLE2.hgv.bam",
+    ]
+    info_lines = (tmp_path / "terms.txt.out.info").read_text().splitlines()
+    assert info_lines[3:] == [
+        "SAMPLE2\t1 matches",
+        "MISSING\t0 matches",
+        "SAMPLE2\t1 matches",
+        "MISSING\t0 matches",
+        "# Total matches found: 2",
+        "# Terms with no matches: 2",
+    ]
+
+
+def test_search_py_line_endings(tmp_path, search_output_root, monkeypatch):
+    """Test search_py splits terms only at line endings."""
+    searched = []
+    real_run_queries = entry.run_queries
+
+    def spy_run_queries(index_path, query_strs, max_results, **kwargs):
+        searched.extend(query_strs)
+        return real_run_queries(index_path, query_strs, max_results, **kwargs)
+
+    monkeypatch.setattr(entry, "run_queries", spy_run_queries)
+    input_file = tmp_path / "terms.txt"
+    input_file.write_text("SAMPLE1\x0cSAMPLE2\r\nMISSING\rSAMPLE2\n")
+    args = make_search_py_args(search_output_root, input_file, uri_only=True)
+    with pytest.raises(SystemExit):
+        search_py(args)
+    assert searched == ["SAMPLE1\x0cSAMPLE2", "MISSING", "SAMPLE2"]
+
+
+def test_search_py_invalid_term(tmp_path, search_output_root):
+    """Test search_py records an invalid query as an error and continues."""
+    input_file = tmp_path / "terms.txt"
+    input_file.write_text("(\nSAMPLE2\n")
+    args = make_search_py_args(search_output_root, input_file, uri_only=True)
+    with pytest.raises(SystemExit) as exc_info:
+        search_py(args)
+    assert exc_info.value.code == 0
+    assert (tmp_path / "terms.txt.out.tsv").read_text() == (
+        "s3://hgsc-a/v1/SAMPLE2/SAMPLE2.hgv.bam\n"
+    )
+    not_found = (tmp_path / "terms.txt.not_found.txt").read_text()
+    assert not_found.startswith("(\tError: ")
+    assert (tmp_path / "terms.txt.not_found.list").read_text() == "(\n"
+
+
+def test_search_aws(search_output_root, capsys):
+    """Test search_aws writes matches to stdout and leaves stderr open."""
+    args = make_search_py_args(search_output_root, None, query="SAMPLE2", uri_only=True)
+    with pytest.raises(SystemExit) as exc_info:
+        search_aws(args)
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out == "s3://hgsc-a/v1/SAMPLE2/SAMPLE2.hgv.bam\n"
+    assert not sys.stderr.closed
+
+
+def test_parse_search_py_args_repeated(monkeypatch):
+    "The cached parser gives independent results for each parse."
+    monkeypatch.setattr("sys.argv", ["search.py", "terms.txt", "-u"])
+    first = parse_search_py_args()
+    monkeypatch.setattr("sys.argv", ["search.py", "-f", "other.txt"])
+    second = parse_search_py_args()
+    assert (first.file, first.uri_only) == ("terms.txt", True)
+    assert (second.file, second.uri_only) == ("other.txt", False)
+
+
+def test_parse_search_aws_args_version(monkeypatch, capsys):
+    "--version prints the program name and version, then exits."
+    monkeypatch.setattr("sys.argv", ["search-aws", "--version"])
+    with pytest.raises(SystemExit) as exc_info:
+        parse_search_aws_args()
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out == f"search-aws {__version__}\n"
+
+
+@pytest.mark.parametrize("jobs", ["0", "-1", "two"])
+def test_parse_scan_args_bad_jobs(monkeypatch, capsys, jobs):
+    "-j/--jobs must be a positive integer."
+    monkeypatch.setattr("sys.argv", ["aos-scan", "-j", jobs])
+    with pytest.raises(SystemExit) as exc_info:
+        parse_scan_args()
+    assert exc_info.value.code == 2
+    assert "must be a positive integer" in capsys.readouterr().err
+
+
+def test_parse_scan_args_without_boto3():
+    "Parsing aos-scan arguments does not import boto3, which is slow to import."
+    code = (
+        "import sys\n"
+        "from aws_object_search.entry import build_scan_parser\n"
+        "build_scan_parser().parse_args(['--no-scan'])\n"
+        "assert 'boto3' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,285 @@
+import signal
+import threading
+import time
+from datetime import UTC, datetime
+
+from botocore.exceptions import ClientError
+from pytest import fixture, raises
+
+from aws_object_search import catalog, s3_wrapper
+from aws_object_search.catalog import S3ObjectCatalog
+from aws_object_search.s3_wrapper import BucketScanner, run_s3_object_scan
+
+
+class FakeS3Client:
+    "Stand-in for a boto3 S3 client that serves objects from memory."
+
+    def __init__(
+        self,
+        buckets: dict[str, list[dict]],
+        page_size: int = 2,
+        errors: dict[str, str] | None = None,
+    ):
+        self.buckets = buckets
+        self.page_size = page_size
+        self.errors = errors or {}
+        self.list_calls = 0
+
+    def list_buckets(self, Prefix: str = ""):
+        names = sorted(b for b in self.buckets if b.startswith(Prefix))
+        return {"Buckets": [{"Name": name} for name in names]}
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        MaxKeys: int = 1000,
+        ContinuationToken: str = "0",
+        Prefix: str = "",
+        Delimiter: str = "",
+        StartAfter: str = "",
+    ):
+        self.list_calls += 1
+        # Errors are keyed by bucket name or by "bucket/prefix".
+        error_code = self.errors.get(Bucket) or self.errors.get(f"{Bucket}/{Prefix}")
+        if error_code:
+            error = {"Error": {"Code": error_code, "Message": "Fake"}}
+            raise ClientError(error, "ListObjectsV2")
+        # Each entry is either an object or a common prefix string.
+        entries = []
+        for obj in self.buckets[Bucket]:
+            key = obj["Key"]
+            if not key.startswith(Prefix) or key <= StartAfter:
+                continue
+            if Delimiter and Delimiter in key[len(Prefix) :]:
+                rest = key[len(Prefix) :]
+                common_prefix = Prefix + rest[: rest.index(Delimiter) + 1]
+                if common_prefix not in entries:
+                    entries.append(common_prefix)
+            else:
+                entries.append(obj)
+        start = int(ContinuationToken)
+        stop = start + min(MaxKeys, self.page_size)
+        chunk = entries[start:stop]
+        page = {"KeyCount": len(chunk)}
+        contents = [e for e in chunk if isinstance(e, dict)]
+        if contents:
+            page["Contents"] = contents
+        common_prefixes = [{"Prefix": e} for e in chunk if isinstance(e, str)]
+        if common_prefixes:
+            page["CommonPrefixes"] = common_prefixes
+        if stop < len(entries):
+            page["IsTruncated"] = True
+            page["NextContinuationToken"] = str(stop)
+        else:
+            page["IsTruncated"] = False
+        return page
+
+
+def make_object(key: str, size: int = 100) -> dict:
+    "Return an object record shaped like the ListObjectsV2 response."
+    return {
+        "Key": key,
+        "LastModified": datetime(2025, 3, 31, 1, 37, 5, tzinfo=UTC),
+        "ETag": '"a65f5b56909bf63398213ae450a879fb"',
+        "ChecksumAlgorithm": ["SHA256"],
+        "ChecksumType": "FULL_OBJECT",
+        "Size": size,
+        "StorageClass": "DEEP_ARCHIVE",
+    }
+
+
+@fixture
+def fake_s3_client() -> FakeS3Client:
+    "Fake client with a few small buckets"
+    return FakeS3Client(
+        {
+            "hgsc-a": [make_object(f"a/file{i}.fastq.gz", i) for i in range(5)],
+            "hgsc-b": [make_object("b/event.json")],
+            "hgsc-c": [],
+            "other": [make_object("other/file.txt")],
+        }
+    )
+
+
+def test_list_buckets_with_prefix(fake_s3_client):
+    "Only buckets matching the prefix are listed."
+    scanner = BucketScanner(fake_s3_client)
+    assert scanner.list_buckets_with_prefix("hgsc-") == ["hgsc-a", "hgsc-b", "hgsc-c"]
+
+
+def test_get_bucket_objects(fake_s3_client):
+    "All pages of a bucket are combined."
+    scanner = BucketScanner(fake_s3_client)
+    keys = [obj["Key"] for obj in scanner.get_bucket_objects("hgsc-a")]
+    assert keys == [f"a/file{i}.fastq.gz" for i in range(5)]
+
+
+def test_get_bucket_objects_close(fake_s3_client):
+    "Closing the objects generator stops listing further pages."
+    scanner = BucketScanner(fake_s3_client)
+    objects = scanner.get_bucket_objects("hgsc-a")
+    assert next(objects)["Key"] == "a/file0.fastq.gz"
+    objects.close()
+    # The first page and the prefetched second page, but not the third.
+    assert fake_s3_client.list_calls == 2
+
+
+def test_get_bucket_objects_start_after(fake_s3_client):
+    "A listing can resume after a given key."
+    scanner = BucketScanner(fake_s3_client)
+    objects = scanner.get_bucket_objects("hgsc-a", start_after="a/file1.fastq.gz")
+    keys = [obj["Key"] for obj in objects]
+    assert keys == [f"a/file{i}.fastq.gz" for i in range(2, 5)]
+
+
+def test_get_bucket_objects_sharded(fake_s3_client):
+    "Sharded listing returns the same objects, top-level objects first."
+    keys = [f"{d}/sub/file{i}" for d in "xyz" for i in range(3)] + ["zz.txt"]
+    fake_s3_client.buckets["hgsc-d"] = [make_object(key) for key in keys]
+    scanner = BucketScanner(fake_s3_client)
+    sharded = [obj["Key"] for obj in scanner.get_bucket_objects_sharded("hgsc-d")]
+    assert [obj["Key"] for obj in scanner.get_bucket_objects("hgsc-d")] == keys
+    assert sharded == ["zz.txt"] + keys[:-1]
+
+
+def test_get_bucket_objects_sharded_error(fake_s3_client):
+    "An error while listing a prefix is raised to the consumer."
+    fake_s3_client.buckets["hgsc-d"] = [make_object("x/file"), make_object("y/file")]
+    fake_s3_client.errors["hgsc-d/y/"] = "InternalError"
+    scanner = BucketScanner(fake_s3_client)
+    objects = scanner.get_bucket_objects_sharded("hgsc-d")
+    assert next(objects)["Key"] == "x/file"
+    with raises(ClientError):
+        list(objects)
+
+
+def test_get_bucket_objects_sharded_error_stops_listing(fake_s3_client):
+    "After a prefix fails, the prefixes not yet listed are skipped."
+    keys = [f"d{i:02}/file" for i in range(20)]
+    fake_s3_client.buckets["hgsc-d"] = [make_object(key) for key in keys]
+    fake_s3_client.errors["hgsc-d/d00/"] = "InternalError"
+    scanner = BucketScanner(fake_s3_client)
+    with raises(ClientError):
+        list(scanner.get_bucket_objects_sharded("hgsc-d", max_workers=1))
+    # 10 pages of top-level prefixes, then only the failed prefix
+    assert fake_s3_client.list_calls <= 11
+
+
+def test_run_s3_object_scan_sharded_writer_error(tmp_path, fake_s3_client, monkeypatch):
+    "If writing fails, the sharded listing workers stop instead of hanging."
+    keys = [f"{d}/file{i:02}" for d in "xyz" for i in range(20)]
+    fake_s3_client.buckets = {"hgsc-d": [make_object(key) for key in keys]}
+
+    def failing_write_tsv_rows(tsv_file, writer, rows):
+        next(rows)
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(catalog, "write_tsv_rows", failing_write_tsv_rows)
+    threads_before = set(threading.enumerate())
+    # Keeping the traceback alive must not keep the workers waiting.
+    with raises(OSError) as exc_info:
+        run_s3_object_scan(
+            tmp_path, "hgsc-", s3_client=fake_s3_client, shard_prefixes=True
+        )
+    for thread in set(threading.enumerate()) - threads_before:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    assert exc_info.traceback
+
+
+def test_run_s3_object_scan_interrupted(tmp_path, fake_s3_client, monkeypatch):
+    "An interrupt stops the buckets being scanned and removes their partial files."
+    keys = [f"file{i:03}" for i in range(100)]
+    fake_s3_client.buckets = {
+        b: [make_object(k) for k in keys] for b in ("hgsc-d", "hgsc-e")
+    }
+    list_objects_v2 = fake_s3_client.list_objects_v2
+
+    def slow_list_objects_v2(**kwargs):
+        time.sleep(0.05)
+        return list_objects_v2(**kwargs)
+
+    monkeypatch.setattr(fake_s3_client, "list_objects_v2", slow_list_objects_v2)
+    # A real SIGINT, since interrupt_main() does not wake a thread waiting on a lock
+    main_thread_id = threading.main_thread().ident
+    timer = threading.Timer(0.3, signal.pthread_kill, (main_thread_id, signal.SIGINT))
+    timer.start()
+    start = time.monotonic()
+    with raises(KeyboardInterrupt):
+        run_s3_object_scan(tmp_path, "hgsc-", s3_client=fake_s3_client, max_workers=2)
+    timer.join()
+    # Listing both buckets to the end would take 2.5 s and 100 calls.
+    assert time.monotonic() - start < 1.5
+    assert fake_s3_client.list_calls < 50
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_s3_object_scan(tmp_path, fake_s3_client):
+    "Scan several buckets concurrently and check the resulting catalog."
+    run_s3_object_scan(
+        tmp_path,
+        "hgsc-",
+        "20250505-164832",
+        s3_client=fake_s3_client,
+        max_workers=2,
+    )
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "20250505-164832-hgsc-a.tsv.gz",
+        "20250505-164832-hgsc-b.tsv.gz",
+        "20250505-164832-hgsc-c.tsv.gz",
+    ]
+    catalog = S3ObjectCatalog(tmp_path)
+    results = list(catalog.iter_dicts())
+    assert len(results) == 6
+    assert results[0] == {
+        "scan_start": "2025-05-05T16:48:32",
+        "bucket_name": "hgsc-a",
+        "last_modified": "2025-03-31T01:37:05+00:00",
+        "size": "0",
+        "storage_class": "DEEP_ARCHIVE",
+        "e_tag": "a65f5b56909bf63398213ae450a879fb",
+        "checksum_algorithm": "SHA256",
+        "checksum_type": "FULL_OBJECT",
+        "key": "a/file0.fastq.gz",
+    }
+    assert results[-1]["key"] == "b/event.json"
+
+
+def test_run_s3_object_scan_pool_size(tmp_path, fake_s3_client, monkeypatch):
+    "The client has a pooled connection for every bucket and prefix worker."
+    pool_sizes = []
+
+    def get_s3_client(max_pool_connections):
+        pool_sizes.append(max_pool_connections)
+        return fake_s3_client
+
+    monkeypatch.setattr(s3_wrapper, "get_s3_client", get_s3_client)
+    run_s3_object_scan(tmp_path, "hgsc-", max_workers=3)
+    run_s3_object_scan(tmp_path, "hgsc-", max_workers=16, shard_prefixes=True)
+    assert pool_sizes == [3, 16 * s3_wrapper.DEFAULT_SHARD_WORKERS]
+
+
+def test_run_s3_object_scan_shared_timestamp(tmp_path, fake_s3_client):
+    "All files from one scan get the same timestamp."
+    run_s3_object_scan(tmp_path, "hgsc-", s3_client=fake_s3_client)
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert len(names) == 3
+    assert len({name[:15] for name in names}) == 1
+
+
+def test_run_s3_object_scan_skips_inaccessible_bucket(tmp_path, fake_s3_client):
+    "A bucket that cannot be listed is skipped without leaving a partial file."
+    fake_s3_client.errors["hgsc-b"] = "AccessDenied"
+    run_s3_object_scan(tmp_path, "hgsc-", "20250505-164832", fake_s3_client)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "20250505-164832-hgsc-a.tsv.gz",
+        "20250505-164832-hgsc-c.tsv.gz",
+    ]
+
+
+def test_run_s3_object_scan_other_error(tmp_path, fake_s3_client):
+    "Other errors stop the scan."
+    fake_s3_client.errors["hgsc-b"] = "InternalError"
+    with raises(ClientError):
+        run_s3_object_scan(tmp_path, "hgsc-", "20250505-164832", fake_s3_client)
+    assert "20250505-164832-hgsc-b.tsv.gz" not in {p.name for p in tmp_path.iterdir()}
@@ -2,11 +2,13 @@ import pytest
 import tantivy
 
 from aws_object_search.tantivy_wrapper import (
+    URI_FIELDS,
     S3ObjectResult,
     build_schema,
     create_index,
     index_catalog,
     regenerate_index,
+    run_queries,
     run_query,
     search_index_simple,
 )
@@ -121,6 +123,51 @@ def test_run_query(tmp_path, sample_documents):
     assert len(results) == 0
 
 
+def test_run_queries(tmp_path, sample_documents):
+    """Test that run_queries returns the results of each query in order."""
+    regenerate_index(tmp_path, sample_documents)
+
+    queries = run_queries(tmp_path, ["file1", "txt", "nonexistent"], max_results=10)
+    results = [(term, sorted(r.key for _score, r in hits)) for term, hits in queries]
+    assert results == [
+        ("file1", ["path/to/file1.txt"]),
+        ("txt", ["another/path/file2.txt", "path/to/file1.txt"]),
+        ("nonexistent", []),
+    ]
+
+    # More queries than are searched ahead with a single worker
+    terms = ["file1", "file2", "nonexistent"] * 3
+    queries = run_queries(tmp_path, terms, max_results=10, max_workers=1)
+    results = [(term, [r.key for _score, r in hits]) for term, hits in queries]
+    assert (
+        results
+        == [
+            ("file1", ["path/to/file1.txt"]),
+            ("file2", ["another/path/file2.txt"]),
+            ("nonexistent", []),
+        ]
+        * 3
+    )
+
+
+def test_run_queries_missing_index(tmp_path):
+    """Test that run_queries raises immediately for a missing index."""
+    with pytest.raises(ValueError):
+        run_queries(tmp_path / "missing", ["file1"])
+
+
+def test_run_query_fields(tmp_path, sample_documents):
+    """Test that run_query reads only the requested fields."""
+    regenerate_index(tmp_path, sample_documents)
+
+    results = list(run_query(tmp_path, "file1", 10, fields=URI_FIELDS))
+    assert len(results) == 1
+    _score, result = results[0]
+    assert result == S3ObjectResult(
+        bucket_name="test-bucket-1", key="path/to/file1.txt"
+    )
+
+
 def test_run_query_max_results(tmp_path, sample_documents):
     """Test that run_query respects max_results parameter."""
     regenerate_index(tmp_path, sample_documents)